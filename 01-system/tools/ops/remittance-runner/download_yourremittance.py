@@ -1,5 +1,6 @@
 import argparse
 import datetime as dt
+import json
 import os
 import re
 import shutil
@@ -39,11 +40,25 @@ DOC_REF_PATTERNS = [
     re.compile(r"Reference\s+Number[:\s]+([A-Za-z0-9-]+)", re.IGNORECASE),
     re.compile(r"Our\s+Ref[:\s]+([A-Za-z0-9-]+)", re.IGNORECASE),
 ]
+GENERIC_LAST_PAGE = 6
+PROFILES_FILE = Path(__file__).resolve().parent / "sender_profiles.json"
+SENDER_ADDRESS_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
 
 LOG_DIR: Optional[Path] = None
 LOG_FILE: Optional[Path] = None
 PDFTOTEXT_PATH: Optional[Path] = None
 WORKSPACE_ROOT: Optional[Path] = None
+SENDER_PROFILES: Optional[Dict[str, "SenderProfile"]] = None
+PROFILE_STATS: Dict[str, Dict[str, int]] = {}
+
+
+@dataclass
+class SenderProfile:
+    name: str
+    pages: int
+    amount_patterns: List[re.Pattern]
+    doc_ref_patterns: List[re.Pattern]
+    region: Optional[Dict[str, int]] = None
 
 
 @dataclass
@@ -55,6 +70,7 @@ class Job:
     portal_url: str
     recipient: str
     mailbox_name: str
+    sender: str = ""
 
     @property
     def passcode_subject(self) -> str:
@@ -196,42 +212,207 @@ def detect_pdftotext() -> Optional[Path]:
     return None
 
 
-def extract_pdf_text(pdf_path: Path) -> str:
+def is_valid_region(region) -> bool:
+    if not isinstance(region, dict):
+        return False
+    values = [region.get(key) for key in ("x", "y", "w", "h")]
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return False
+    return values[2] > 0 and values[3] > 0
+
+
+def build_sender_profile(name: str, spec) -> Tuple[SenderProfile, List[str]]:
+    """Validate one sender_profiles.json entry; raises ValueError describing the first problem."""
+    if not isinstance(spec, dict):
+        raise ValueError("profile must be an object")
+    enabled = spec.get("enabled", True)
+    if not isinstance(enabled, bool):
+        raise ValueError("enabled must be true or false")
+    senders = spec.get("senders", [])
+    if not isinstance(senders, list) or not all(isinstance(key, str) for key in senders):
+        raise ValueError("senders must be a list of strings")
+    pages = spec.get("pages", 1)
+    if not isinstance(pages, int) or isinstance(pages, bool):
+        raise ValueError("pages must be an integer")
+    patterns: Dict[str, List[re.Pattern]] = {}
+    for field in ("amount", "docRef"):
+        values = spec.get(field, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"{field} must be a list of regex strings")
+        try:
+            patterns[field] = [re.compile(value) for value in values]
+        except re.error as exc:
+            raise ValueError(f"invalid {field} regex: {exc}") from exc
+    region = spec.get("region")
+    if region is not None and not is_valid_region(region):
+        raise ValueError("region needs numeric x, y and positive w, h")
+    profile = SenderProfile(
+        name=name,
+        pages=max(1, min(pages, GENERIC_LAST_PAGE)),
+        amount_patterns=patterns["amount"],
+        doc_ref_patterns=patterns["docRef"],
+        region=region,
+    )
+    # Disabled profiles are still validated but route no senders.
+    return profile, [key.strip().lower() for key in senders] if enabled else []
+
+
+def load_sender_profiles() -> Dict[str, SenderProfile]:
+    """Index sender_profiles.json by lower-cased sender address or domain."""
+    global SENDER_PROFILES
+    if SENDER_PROFILES is not None:
+        return SENDER_PROFILES
+    SENDER_PROFILES = {}
+    if not PROFILES_FILE.exists():
+        return SENDER_PROFILES
+    try:
+        raw = json.loads(PROFILES_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        log(f"Failed to load {PROFILES_FILE.name}; using generic parsing only: {exc}")
+        return SENDER_PROFILES
+    if not isinstance(raw, dict):
+        log(f"{PROFILES_FILE.name} must contain an object keyed by profile name; using generic parsing only.")
+        return SENDER_PROFILES
+    profiles: Dict[str, SenderProfile] = {}
+    for name, spec in raw.items():
+        try:
+            profile, keys = build_sender_profile(name, spec)
+        except ValueError as exc:
+            log(f"Skipping sender profile {name}: {exc}")
+            continue
+        for key in keys:
+            profiles[key] = profile
+    SENDER_PROFILES = profiles
+    return SENDER_PROFILES
+
+
+def find_sender_profile(sender: str) -> Optional[SenderProfile]:
+    match = SENDER_ADDRESS_RE.search(sender or "")
+    if not match:
+        return None
+    address = match.group(0).lower()
+    profiles = load_sender_profiles()
+    if address in profiles:
+        return profiles[address]
+    return profiles.get(address.split("@", 1)[1])
+
+
+def extract_pdf_text(
+    pdf_path: Path,
+    first_page: int = 1,
+    last_page: int = GENERIC_LAST_PAGE,
+    region: Optional[Dict[str, int]] = None,
+) -> Tuple[str, int]:
+    """Return the text of the requested page range and how many pages pdftotext emitted."""
     global PDFTOTEXT_PATH
     if PDFTOTEXT_PATH is None:
         PDFTOTEXT_PATH = detect_pdftotext()
     if not PDFTOTEXT_PATH:
         log("pdftotext not available; cannot extract text for metadata parsing.")
-        return ""
+        return "", 0
+    cmd = [str(PDFTOTEXT_PATH), "-layout", "-f", str(first_page), "-l", str(last_page), "-enc", "UTF-8"]
+    if region:
+        cmd += ["-x", str(int(region["x"])), "-y", str(int(region["y"])), "-W", str(int(region["w"])), "-H", str(int(region["h"]))]
+    cmd += [str(pdf_path), "-"]
     try:
-        result = subprocess.run(
-            [str(PDFTOTEXT_PATH), "-layout", "-nopgbrk", "-q", "-f", "1", "-l", "6", "-enc", "UTF-8", str(pdf_path), "-"],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        return result.stdout
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
     except subprocess.CalledProcessError as exc:
-        log(f"pdftotext failed for {pdf_path.name}: {exc}")
-        return ""
+        # Asking for a page past the end fails with "Wrong page range" (exit 99); callers treat that
+        # as end of input. Anything else is a real failure and is logged.
+        stderr = (exc.stderr or "").strip()
+        past_end = first_page > 1 and exc.returncode == 99 and "page range" in stderr.lower()
+        if not past_end:
+            log(f"pdftotext failed for {pdf_path.name} (pages {first_page}-{last_page}, exit {exc.returncode}): {stderr or exc}")
+        return "", 0
+    # Each page is terminated by a form feed. Follow it with a newline so (?m)^ also matches at the
+    # top of the next page.
+    return result.stdout.replace("\f", "\f\n"), result.stdout.count("\f")
+
+
+def search_patterns(patterns: Iterable[re.Pattern], text: str) -> Optional[str]:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def is_date_like(value: str) -> bool:
+    # dd.mm(.yyyy) or dd/mm(.yyyy) without a currency symbol, as in the PowerShell runner
+    if value.startswith("$"):
+        return False
+    match = re.match(r"^(\d{1,2})[./](\d{1,2})([./]\d{2,4})?$", value)
+    return bool(match and 1 <= int(match.group(1)) <= 31 and 1 <= int(match.group(2)) <= 12)
+
+
+def pick_amount(patterns: Iterable[re.Pattern], text: str) -> Optional[str]:
+    """Return the largest non-date amount captured by any of the patterns."""
+    best: Optional[Tuple[float, str]] = None
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            clean = re.sub(r"\s", "", match.group(1))
+            if not clean or is_date_like(clean):
+                continue
+            try:
+                value = abs(float(clean.replace("$", "").replace(",", "")))
+            except ValueError:
+                continue
+            if best is None or value > best[0]:
+                best = (value, clean)
+    return best[1] if best else None
+
+
+def record_extraction(name: str, pages: int, profile_hit: bool) -> None:
+    stats = PROFILE_STATS.setdefault(name, {"docs": 0, "hits": 0, "pages": 0})
+    stats["docs"] += 1
+    stats["pages"] += pages
+    if profile_hit:
+        stats["hits"] += 1
+
+
+def report_profile_stats() -> None:
+    for name, stats in sorted(PROFILE_STATS.items()):
+        docs = stats["docs"]
+        hits = f"{stats['hits']}/{docs} profile hit(s)" if name != "generic" else f"{docs} doc(s), no profile"
+        log(f"Extraction [{name}]: {hits}, {stats['pages']} page(s) read ({stats['pages'] / docs:.1f}/doc)")
 
 
-def parse_pdf_metadata(pdf_path: Path) -> Tuple[Optional[str], Optional[str]]:
-    text = extract_pdf_text(pdf_path)
-    if not text:
-        return None, None
+def parse_pdf_metadata(pdf_path: Path, sender: str = "") -> Tuple[Optional[str], Optional[str]]:
+    profile = find_sender_profile(sender)
+    text = ""
+    pages_read = 0
     amount: Optional[str] = None
-    for pattern in AMOUNT_PATTERNS:
-        match = pattern.search(text)
-        if match:
-            amount = match.group(1).replace(",", "")
-            break
     doc_ref: Optional[str] = None
-    for pattern in DOC_REF_PATTERNS:
-        match = pattern.search(text)
-        if match:
-            doc_ref = match.group(1).strip()
-            break
+    reached_end = False
+    if profile:
+        # Stream page by page and stop as soon as the profile's fields are found.
+        for page in range(1, profile.pages + 1):
+            chunk, emitted = extract_pdf_text(pdf_path, page, page, profile.region)
+            if not emitted:
+                reached_end = True
+                break
+            pages_read += emitted
+            text += chunk
+            amount = pick_amount(profile.amount_patterns, text)
+            doc_ref = doc_ref or search_patterns(profile.doc_ref_patterns, text)
+            if amount and doc_ref:
+                break
+    profile_hit = bool(profile and amount and doc_ref)
+    if not profile_hit:
+        if profile and profile.region:
+            # Cropped text is not enough for the generic patterns; re-read whole pages.
+            # The re-read covers the cropped pages again, so count distinct pages.
+            text, pages = extract_pdf_text(pdf_path)
+            pages_read = max(pages_read, pages)
+        elif not reached_end and pages_read < GENERIC_LAST_PAGE:
+            rest, pages = extract_pdf_text(pdf_path, pages_read + 1, GENERIC_LAST_PAGE)
+            text += rest
+            pages_read += pages
+        amount = amount or search_patterns(AMOUNT_PATTERNS, text)
+        doc_ref = doc_ref or search_patterns(DOC_REF_PATTERNS, text)
+    record_extraction(profile.name if profile else "generic", pages_read, profile_hit)
+    if amount:
+        amount = re.sub(r"[\s$,]", "", amount)
     return doc_ref, amount
 
 
@@ -375,6 +556,7 @@ def create_job_from_msg(msg_path: Path, store: str, date_key: str) -> Optional[J
             portal_url=portal_url,
             recipient=recipient_field,
             mailbox_name=mailbox,
+            sender=sender,
         )
     finally:
         message.close()
@@ -416,7 +598,7 @@ def download_for_job(
         suggested = download.suggested_filename or f"{job.transmission_id}.pdf"
         temp_path = unique_path(downloads_dir, suggested)
         download.save_as(str(temp_path))
-        doc_ref, amount = parse_pdf_metadata(temp_path)
+        doc_ref, amount = parse_pdf_metadata(temp_path, job.sender)
         preferred_name = build_target_filename(job, doc_ref, amount, suggested)
         dest = unique_path(store_dir, preferred_name)
         shutil.move(str(temp_path), str(dest))
@@ -485,6 +667,7 @@ def main() -> None:
                 log(f"Failed to download {job.transmission_id}: {exc}")
         context.close()
         browser.close()
+    report_profile_stats()
     log(f"Completed {completed} of {len(jobs)} job(s).")
 
 
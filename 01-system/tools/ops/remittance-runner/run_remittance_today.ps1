@@ -92,20 +92,21 @@ function Get-PdfToTextPath {
   return $null
 }
 
+function Is-DateLikeNumber {
+  param([Parameter(Mandatory)][string]$Value)
+  # Filter out dd.mm(.yyyy) or dd/mm(.yyyy) without a currency symbol
+  if ($Value -match '^\$') { return $false }
+  if ($Value -match '^(\d{1,2})[./](\d{1,2})([./]\d{2,4})?$') {
+    $d = [int]$Matches[1]; $m = [int]$Matches[2]
+    if ($d -ge 1 -and $d -le 31 -and $m -ge 1 -and $m -le 12) { return $true }
+  }
+  return $false
+}
+
 function Parse-AmountFromText {
   param([Parameter(Mandatory)][string]$Text)
   if ([string]::IsNullOrWhiteSpace($Text)) { return '' }
   $currencyPattern = '(\$?\s*-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))'
-  function Is-DateLikeNumber {
-    param([Parameter(Mandatory)][string]$Value)
-    # Filter out dd.mm(.yyyy) or dd/mm(.yyyy) without a currency symbol
-    if ($Value -match '^\$') { return $false }
-    if ($Value -match '^(\d{1,2})[./](\d{1,2})([./]\d{2,4})?$') {
-      $d = [int]$Matches[1]; $m = [int]$Matches[2]
-      if ($d -ge 1 -and $d -le 31 -and $m -ge 1 -and $m -le 12) { return $true }
-    }
-    return $false
-  }
   $patterns = @(
     "(?is)\b(?:grand\s+total|total\s+amount|amount\s+paid|total\s+paid|net\s+total|invoice\s+total)\b[\s\S]{0,200}?$currencyPattern",
     "(?is)\b(?:total(?:\s+amount)?|balance\s+due)\b[\s\S]{0,200}?$currencyPattern",
@@ -288,6 +289,9 @@ function Save-EmbeddedMsgAttachments {
     if (-not $innerAtts -or $innerAtts.Count -le 0) { return }
     $amtFromMail = $DefaultAmountFromMail
     try { if (-not $amtFromMail) { $amtFromMail = Get-AmountFromMail -Mail $inner } } catch {}
+    $innerSender = ''; try { $innerSender = [string]$inner.SenderEmailAddress } catch {}
+    $innerSmtp = ''; try { $innerSmtp = [string](Get-PrimarySmtpAddress -Item $inner) } catch {}
+    $innerProfile = Find-SenderProfile -Senders @($innerSmtp, $innerSender)
     for ($ji = 1; $ji -le $innerAtts.Count; $ji++) {
       $innerAtt = $innerAtts.Item($ji); if (-not $innerAtt) { continue }
       $innerFn = [string]$innerAtt.FileName
@@ -315,7 +319,7 @@ function Save-EmbeddedMsgAttachments {
         $innerAtt.SaveAsFile($target)
         $finalPath = $target
         if (-not $amtFromMail) {
-          $renamed = Try-RenameWithAmount -Path $target
+          $renamed = Try-RenameWithAmount -Path $target -SenderProfile $innerProfile
           if ($renamed -and (Test-Path -LiteralPath $renamed)) {
             if ($renamed -ne $target -and (Test-Path -LiteralPath $target)) { Remove-Item -LiteralPath $target -Force }
             $finalPath = $renamed
@@ -344,28 +348,205 @@ function Get-AmountFromMail {
   catch { return '' }
 }
 
+function Load-SenderProfiles {
+  param([string]$Path)
+  # Index sender_profiles.json by lower-cased sender address or domain (same keys as supplier_map.json).
+  $result = @{}
+  if (-not $Path -or -not (Test-Path -LiteralPath $Path)) { return $result }
+  try { $obj = ConvertFrom-Json -InputObject (Get-Content -LiteralPath $Path -Raw) }
+  catch { Write-Warning ("Failed to load sender profiles; using generic parsing only: {0}" -f $_.Exception.Message); return $result }
+  if (-not ($obj -is [System.Management.Automation.PSCustomObject])) {
+    Write-Warning "sender_profiles.json must contain an object keyed by profile name; using generic parsing only."
+    return $result
+  }
+  foreach ($prop in $obj.PSObject.Properties) {
+    # Validate each profile on its own so one bad entry does not disable the rest.
+    try {
+      $spec = $prop.Value
+      if (-not ($spec -is [System.Management.Automation.PSCustomObject])) { throw 'profile must be an object' }
+      $enabled = $true
+      if ($spec.PSObject.Properties['enabled']) {
+        if (-not ($spec.enabled -is [bool])) { throw 'enabled must be true or false' }
+        $enabled = $spec.enabled
+      }
+      $senders = @()
+      if ($spec.PSObject.Properties['senders']) {
+        $senders = @($spec.senders)
+        foreach ($key in $senders) { if (-not ($key -is [string])) { throw 'senders must be a list of strings' } }
+      }
+      $pages = 1
+      if ($spec.PSObject.Properties['pages']) {
+        if (-not ($spec.pages -is [int] -or $spec.pages -is [long])) { throw 'pages must be an integer' }
+        $pages = [int][Math]::Max(1, [Math]::Min([long]$spec.pages, 6))
+      }
+      $region = $null
+      if ($spec.PSObject.Properties['region']) {
+        $region = $spec.region
+        $regionOk = $region -is [System.Management.Automation.PSCustomObject]
+        if ($regionOk) {
+          foreach ($axis in 'x', 'y', 'w', 'h') {
+            $axisProp = $region.PSObject.Properties[$axis]
+            if (-not $axisProp -or -not ($axisProp.Value -is [int] -or $axisProp.Value -is [long] -or $axisProp.Value -is [double] -or $axisProp.Value -is [decimal])) { $regionOk = $false; break }
+          }
+        }
+        if ($regionOk -and ($region.w -le 0 -or $region.h -le 0)) { $regionOk = $false }
+        if (-not $regionOk) { throw 'region needs numeric x, y and positive w, h' }
+      }
+      $amount = @(); if ($spec.PSObject.Properties['amount']) { $amount = @($spec.amount | ForEach-Object { [regex]::new([string]$_) }) }
+      $docRef = @(); if ($spec.PSObject.Properties['docRef']) { $docRef = @($spec.docRef | ForEach-Object { [regex]::new([string]$_) }) }
+      $entry = [pscustomobject]@{ Name = [string]$prop.Name; Pages = $pages; Region = $region; Amount = $amount; DocRef = $docRef }
+      # Disabled profiles are still validated but route no senders.
+      if ($enabled) { foreach ($key in $senders) { $result[$key.Trim().ToLower()] = $entry } }
+    }
+    catch {
+      $reason = if ($_.Exception.InnerException) { $_.Exception.InnerException.Message } else { $_.Exception.Message }
+      Write-Warning ("Skipping sender profile {0}: {1}" -f $prop.Name, $reason)
+    }
+  }
+  return $result
+}
+
+function Find-SenderProfile {
+  param([string[]]$Senders)
+  if (-not $script:SenderProfiles -or $script:SenderProfiles.Count -eq 0) { return $null }
+  foreach ($s in $Senders) {
+    if ([string]::IsNullOrWhiteSpace($s)) { continue }
+    $lower = $s.Trim().ToLower()
+    if ($script:SenderProfiles.ContainsKey($lower)) { return $script:SenderProfiles[$lower] }
+    if ($lower -match '@(.+)$' -and $script:SenderProfiles.ContainsKey($Matches[1])) { return $script:SenderProfiles[$Matches[1]] }
+  }
+  return $null
+}
+
+function Get-PdfPageText {
+  param(
+    [Parameter(Mandatory)][string]$Tool,
+    [Parameter(Mandatory)][string]$Path,
+    [int]$First = 1,
+    [int]$Last = 6,
+    $Region
+  )
+  # Pages are terminated by form feeds so callers can count what was read; a range past the end yields ''
+  # ("Wrong page range", exit 99). Other failures are reported.
+  try {
+    $crop = ''
+    if ($Region) { $crop = ('-x {0} -y {1} -W {2} -H {3} ' -f [int]$Region.x, [int]$Region.y, [int]$Region.w, [int]$Region.h) }
+    $psi = New-Object System.Diagnostics.ProcessStartInfo
+    $psi.FileName = $Tool
+    $psi.Arguments = ('-layout -f {0} -l {1} {2}-enc UTF-8 "{3}" -' -f $First, $Last, $crop, $Path)
+    $psi.UseShellExecute = $false
+    $psi.RedirectStandardOutput = $true
+    $psi.RedirectStandardError = $true
+    $p = [System.Diagnostics.Process]::Start($psi)
+    # Drain stderr asynchronously: malformed PDFs can fill its pipe while stdout is still being read.
+    $errTask = $p.StandardError.ReadToEndAsync()
+    $text = $p.StandardOutput.ReadToEnd()
+    $p.WaitForExit()
+    $err = $errTask.Result
+    if ($p.ExitCode -ne 0) {
+      $pastEnd = ($First -gt 1) -and ($p.ExitCode -eq 99) -and ($err -match 'page range')
+      if (-not $pastEnd) { Write-Warning ("pdftotext failed for {0} (pages {1}-{2}, exit {3}): {4}" -f [IO.Path]::GetFileName($Path), $First, $Last, $p.ExitCode, $err.Trim()) }
+      return ''
+    }
+    # Follow each form feed with a newline so (?m)^ also matches at the top of the next page.
+    return $text.Replace("`f", "`f`n")
+  }
+  catch { Write-Warning ("pdftotext failed for {0}: {1}" -f [IO.Path]::GetFileName($Path), $_.Exception.Message); return '' }
+}
+
+function Get-PageCount {
+  param([string]$Text)
+  if (-not $Text) { return 0 }
+  return ([regex]::Matches($Text, "`f")).Count
+}
+
+function Match-FirstPattern {
+  param([object[]]$Patterns, [string]$Text)
+  if (-not $Text) { return '' }
+  foreach ($re in $Patterns) {
+    $m = $re.Match($Text)
+    if ($m.Success -and $m.Groups[1].Value.Trim()) { return ($m.Groups[1].Value -replace '\s', '') }
+  }
+  return ''
+}
+
+function Select-ProfileAmount {
+  param([object[]]$Patterns, [string]$Text)
+  # Same rules as Parse-AmountFromText: skip date-like values, keep the largest magnitude.
+  if (-not $Text) { return '' }
+  $best = ''; $bestValue = -1
+  foreach ($re in $Patterns) {
+    foreach ($m in $re.Matches($Text)) {
+      $clean = ($m.Groups[1].Value -replace '\s', '')
+      if (-not $clean) { continue }
+      if (Is-DateLikeNumber -Value $clean) { continue }
+      try { $value = [math]::Abs([decimal]::Parse(($clean -replace '[$,]', ''), [System.Globalization.CultureInfo]::InvariantCulture)) } catch { continue }
+      if ($value -gt $bestValue) { $best = $clean; $bestValue = $value }
+    }
+  }
+  return $best
+}
+
+function Add-ExtractionStat {
+  param([Parameter(Mandatory)][string]$Name, [int]$Pages, [bool]$ProfileHit)
+  if (-not $script:ExtractionStats.ContainsKey($Name)) { $script:ExtractionStats[$Name] = [pscustomobject]@{ Docs = 0; Hits = 0; Pages = 0 } }
+  $stat = $script:ExtractionStats[$Name]
+  $stat.Docs++
+  $stat.Pages += $Pages
+  if ($ProfileHit) { $stat.Hits++ }
+}
+
+function Write-ExtractionStats {
+  foreach ($name in ($script:ExtractionStats.Keys | Sort-Object)) {
+    $stat = $script:ExtractionStats[$name]
+    $hits = if ($name -eq 'generic') { "{0} doc(s), no profile" -f $stat.Docs } else { "{0}/{1} profile hit(s)" -f $stat.Hits, $stat.Docs }
+    Write-Host ("Extraction [{0}]: {1}, {2} page(s) read ({3:N1}/doc)" -f $name, $hits, $stat.Pages, ($stat.Pages / $stat.Docs))
+  }
+}
+
 function Try-RenameWithAmount {
-  param([Parameter(Mandatory)][string]$Path)
+  param([Parameter(Mandatory)][string]$Path, $SenderProfile)
   if (-not (Test-Path -LiteralPath $Path)) { return $Path }
   $ext = [System.IO.Path]::GetExtension($Path)
   if ($ext -notmatch '^\.pdf$' -and $ext -notmatch '^\.PDF$') { return $Path }
   $tool = Get-PdfToTextPath
   $text = ''
-  if ($tool) {
-    try {
-      $psi = New-Object System.Diagnostics.ProcessStartInfo
-      $psi.FileName = $tool
-      $psi.Arguments = ('-layout -nopgbrk -q -f 1 -l 6 -enc UTF-8 "{0}" -' -f $Path)
-      $psi.UseShellExecute = $false
-      $psi.RedirectStandardOutput = $true
-      $psi.RedirectStandardError = $true
-      $p = [System.Diagnostics.Process]::Start($psi)
-      $text = $p.StandardOutput.ReadToEnd()
-      $null = $p.StandardError.ReadToEnd()
-      $p.WaitForExit()
+  $amt = ''
+  $docRef = ''
+  $pagesRead = 0
+  $profileHit = $false
+  if ($tool -and $SenderProfile) {
+    # Stream page by page within the profile's page hint and stop once its fields are found.
+    $reachedEnd = $false
+    for ($pg = 1; $pg -le $SenderProfile.Pages; $pg++) {
+      $chunk = Get-PdfPageText -Tool $tool -Path $Path -First $pg -Last $pg -Region $SenderProfile.Region
+      $emitted = Get-PageCount -Text $chunk
+      if ($emitted -eq 0) { $reachedEnd = $true; break }
+      $pagesRead += $emitted
+      $text += $chunk
+      $amt = Select-ProfileAmount -Patterns $SenderProfile.Amount -Text $text
+      if (-not $docRef) { $docRef = Match-FirstPattern -Patterns $SenderProfile.DocRef -Text $text }
+      if ($amt -and $docRef) { $profileHit = $true; break }
     }
-    catch {}
+    if (-not $profileHit) {
+      if ($SenderProfile.Region) {
+        # Cropped text is not enough for the generic patterns; re-read whole pages.
+        # The re-read covers the cropped pages again, so count distinct pages.
+        $text = Get-PdfPageText -Tool $tool -Path $Path
+        $pagesRead = [Math]::Max($pagesRead, (Get-PageCount -Text $text))
+      }
+      elseif (-not $reachedEnd -and $pagesRead -lt 6) {
+        $rest = Get-PdfPageText -Tool $tool -Path $Path -First ($pagesRead + 1) -Last 6
+        $text += $rest
+        $pagesRead += Get-PageCount -Text $rest
+      }
+    }
+  }
+  elseif ($tool) {
+    $text = Get-PdfPageText -Tool $tool -Path $Path
+    $pagesRead = Get-PageCount -Text $text
   }
+  Add-ExtractionStat -Name $(if ($SenderProfile) { $SenderProfile.Name } else { 'generic' }) -Pages $pagesRead -ProfileHit $profileHit
   if (-not $text) {
     try {
       # Adobe Acrobat COM text export (requires Acrobat Pro, not Reader)
@@ -397,9 +578,9 @@ function Try-RenameWithAmount {
     catch { try { if ($doc) { $doc.Close($false) } } catch {}; try { if ($word) { $word.Quit() } } catch {} }
   }
   if (-not $text) { return $Path }
-  $amt = Parse-AmountFromText -Text $text
+  if (-not $amt) { $amt = Parse-AmountFromText -Text $text }
   if (-not $amt) { return $Path }
-  $docRef = Parse-DocumentReference -Text $text
+  if (-not $docRef) { $docRef = Parse-DocumentReference -Text $text }
   $dir = Split-Path -Parent $Path
   $name = [System.IO.Path]::GetFileNameWithoutExtension($Path)
   $ext = [System.IO.Path]::GetExtension($Path)
@@ -480,6 +661,9 @@ try {
     $processedMaps[$storeName] = [PSCustomObject]@{ File = $procFile; Set = $set }
   }
 
+  $script:SenderProfiles = Load-SenderProfiles -Path (Join-Path $scriptRoot 'sender_profiles.json')
+  $script:ExtractionStats = @{}
+
   $outlook = Get-OutlookApp
   $ns = $outlook.GetNamespace('MAPI')
   $stores = $Stores
@@ -667,7 +851,7 @@ try {
           try {
             $att.SaveAsFile($cand)
             if (-not $amtFromMail) {
-              $newPath = Try-RenameWithAmount -Path $cand
+              $newPath = Try-RenameWithAmount -Path $cand -SenderProfile (Find-SenderProfile -Senders @($senderSmtpLower, $senderLower))
               if ($newPath -and (Test-Path -LiteralPath $newPath)) {
                 if ($newPath -ne $cand -and (Test-Path -LiteralPath $cand)) { Remove-Item -LiteralPath $cand -Force }
                 Write-Host "Saved: $newPath"
@@ -738,6 +922,7 @@ try {
       Write-Warning ("Failed to move MSG files to intermediate: {0}" -f $_.Exception.Message)
     }
   }
+  Write-ExtractionStats
   Write-Host ("Saved files under: {0}" -f $SaveRoot)
 }
 catch {